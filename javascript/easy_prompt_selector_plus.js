@@ -201,6 +201,7 @@ class EPSElementBuilder {
 class EasyPromptSelector {
   // 定数定義
   PATH_FILE = 'tmp/easyPromptSelectorPlus.txt'  // 設定ファイルのパス
+  MANIFEST_URL = 'easy_prompt_selector_plus/manifest' // マニフェスト差分のURL
   AREA_ID = 'easy-prompt-selector-plus'          // メインエリアのID
   SELECT_ID = 'easy-prompt-selector-plus-select' // セレクトボックスのID
   CONTENT_ID = 'easy-prompt-selector-plus-content' // コンテンツエリアのID
@@ -216,7 +217,10 @@ class EasyPromptSelector {
     this.gradioApp = gradioApp
     this.visible = false
     this.toNegative = false
-    this.tags = undefined
+    this.tags = {}
+    this.manifestId = ''     // 同期済みのマニフェストのID
+    this.manifestVersion = 0 // 同期済みのマニフェストのバージョン
+    this.files = {}          // ファイルパス -> { hash, key }
   }
 
   /**
@@ -225,9 +229,18 @@ class EasyPromptSelector {
   async init() {
     try {
       debugPrint('初期化処理を開始します');
-      this.tags = await this.parseFiles()
+      const changed = await this.syncFiles()
 
       const tagArea = gradioApp().querySelector(`#${this.AREA_ID}`)
+      if (tagArea != null && changed !== null) {
+        this.updateContent(tagArea, changed)
+        debugPrint(`変更されたカテゴリを更新しました: ${changed.size}件`);
+        return
+      }
+
+      if (changed === null) {
+        this.tags = await this.parseFiles()
+      }
       if (tagArea != null) {
         this.visible = false
         this.changeVisibility(tagArea, this.visible)
@@ -246,12 +259,13 @@ class EasyPromptSelector {
   /**
    * ファイルを読み込む
    * @param {string} filepath - 読み込むファイルのパス
-   * @returns {Promise<string>} ファイルの内容
+   * @param {string} cacheKey - キャッシュ無効化用のキー（ファイルのハッシュなど）
+   * @returns {Promise<string|null>} ファイルの内容（読み込みに失敗した場合は null）
    */
-  async readFile(filepath) {
+  async readFile(filepath, cacheKey = new Date().getTime()) {
     try {
       debugPrint(`ファイルを読み込みます: ${filepath}`);
-      const response = await fetch(`file=${filepath}?${new Date().getTime()}`);
+      const response = await fetch(`file=${filepath}?${cacheKey}`);
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
@@ -260,7 +274,85 @@ class EasyPromptSelector {
       return text;
     } catch (error) {
       console.error(`ファイル読み込み中にエラーが発生しました (${filepath}): ${error.message}`);
-      return '';
+      return null;
+    }
+  }
+
+  /**
+   * ファイルパスからタグのカテゴリ名を取得
+   * @param {string} path - ファイルパス
+   * @returns {string} カテゴリ名
+   */
+  categoryOf(path) {
+    return path.split('/').pop().split('.').slice(0, -1).join('.')
+  }
+
+  /**
+   * マニフェストの差分を取得し、変更されたタグファイルだけを読み込む
+   * @returns {Promise<Set<string>|null>} 変更されたカテゴリ名（取得に失敗した場合は null）
+   */
+  async syncFiles() {
+    try {
+      debugPrint(`マニフェストの差分を取得します: version ${this.manifestVersion}`);
+      const response = await fetch(`${this.MANIFEST_URL}?since=${this.manifestVersion}&manifest_id=${this.manifestId}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const manifest = await response.json();
+      const changed = new Set();
+      let failed = false;
+
+      if (manifest.full) {
+        Object.keys(this.tags).forEach((key) => changed.add(key));
+        this.tags = {};
+        this.files = {};
+      }
+
+      for (const path of manifest.removed) {
+        const file = this.files[path];
+        if (file === undefined) continue;
+        delete this.tags[file.key];
+        delete this.files[path];
+        changed.add(file.key);
+      }
+
+      for (const entry of manifest.changed) {
+        try {
+          const key = this.categoryOf(entry.path);
+          const data = await this.readFile(entry.path, entry.hash);
+          if (data === null) {
+            throw new Error('ファイルを読み込めませんでした');
+          }
+          let doc = null;
+          this.yaml.loadAll(data, function (d) {
+            doc = d;
+          });
+          if (doc == null) {
+            delete this.tags[key];
+          } else {
+            this.tags[key] = doc;
+          }
+          this.files[entry.path] = { hash: entry.hash, key };
+          changed.add(key);
+          debugPrint(`タグファイルを解析しました: ${key}`);
+        } catch (error) {
+          console.error(`タグファイルの解析中にエラーが発生しました (${entry.path}): ${error.message}`);
+          failed = true;
+        }
+      }
+
+      // 読み込みに失敗したファイルがある場合は、次回の同期で再取得するためバージョンを進めない
+      if (failed) {
+        debugPrint(`読み込みに失敗したファイルがあるため、マニフェストのバージョンを据え置きます: version ${this.manifestVersion}`);
+        return changed;
+      }
+      this.manifestId = manifest.id;
+      this.manifestVersion = manifest.version;
+      debugPrint(`マニフェストを同期しました: version ${manifest.version} (${changed.size}カテゴリ)`);
+      return changed;
+    } catch (error) {
+      console.error(`マニフェストの同期中にエラーが発生しました: ${error.message}`);
+      return null;
     }
   }
 
@@ -272,7 +364,7 @@ class EasyPromptSelector {
     try {
       debugPrint('設定ファイルの解析を開始します');
       const text = await this.readFile(this.PATH_FILE);
-      if (text === '') {
+      if (!text) {
         debugPrint('設定ファイルが空です');
         return {};
       }
@@ -282,8 +374,9 @@ class EasyPromptSelector {
 
       for (const path of paths) {
         try {
-          const filename = path.split('/').pop().split('.').slice(0, -1).join('.');
+          const filename = this.categoryOf(path);
           const data = await this.readFile(path);
+          if (data === null) continue;
           this.yaml.loadAll(data, function (doc) {
             tags[filename] = doc;
           });
@@ -312,8 +405,6 @@ class EasyPromptSelector {
     row.style.gap = '10px'
 
     const dropDown = this.renderDropdown()
-    dropDown.style.flex = '1'
-    dropDown.style.minWidth = '1'
     row.appendChild(dropDown)
 
     const settings = document.createElement('div')
@@ -350,6 +441,8 @@ class EasyPromptSelector {
         }
       }
     )
+    dropDown.style.flex = '1'
+    dropDown.style.minWidth = '1'
 
     return dropDown
   }
@@ -363,22 +456,63 @@ class EasyPromptSelector {
     content.id = this.CONTENT_ID
 
     Object.keys(this.tags).forEach((key) => {
-      const values = this.tags[key]
+      content.appendChild(this.renderCategory(key))
+    })
 
-      const fields = EPSElementBuilder.tagFields()
-      fields.id = `easy-prompt-selector-plus-container-${key}`
-      fields.style.display = 'none'
-      fields.style.flexDirection = 'row'
-      fields.style.marginTop = '10px'
+    return content
+  }
 
-      this.renderTagButtons(values, key).forEach((group) => {
-        fields.appendChild(group)
-      })
+  /**
+   * カテゴリのタグボタン群のレンダリング
+   * @param {string} key - カテゴリ名
+   * @returns {HTMLElement} 作成されたカテゴリ要素
+   */
+  renderCategory(key) {
+    const fields = EPSElementBuilder.tagFields()
+    fields.id = `easy-prompt-selector-plus-container-${key}`
+    fields.style.display = 'none'
+    fields.style.flexDirection = 'row'
+    fields.style.marginTop = '10px'
 
-      content.appendChild(fields)
+    this.renderTagButtons(this.tags[key], key).forEach((group) => {
+      fields.appendChild(group)
     })
 
-    return content
+    return fields
+  }
+
+  /**
+   * 変更されたカテゴリだけを再レンダリング
+   * @param {HTMLElement} tagArea - メインエリアの要素
+   * @param {Set<string>} changed - 変更されたカテゴリ名
+   */
+  updateContent(tagArea, changed) {
+    if (changed.size === 0) return
+
+    const select = tagArea.querySelector(`#${this.SELECT_ID}`)
+    const selected = select.value
+    const dropDown = this.renderDropdown()
+    select.replaceWith(dropDown)
+    dropDown.value = selected in this.tags ? selected : 'なし'
+
+    const content = tagArea.querySelector(`#${this.CONTENT_ID}`)
+    const nodes = Array.from(content.childNodes)
+    changed.forEach((key) => {
+      const id = `easy-prompt-selector-plus-container-${key}`
+      const current = nodes.find((node) => node.id === id)
+      if (!(key in this.tags)) {
+        if (current) current.remove()
+        return
+      }
+
+      const fields = this.renderCategory(key)
+      if (current) {
+        current.replaceWith(fields)
+      } else {
+        content.appendChild(fields)
+      }
+      this.changeVisibility(fields, key === selected)
+    })
   }
 
   /**
@@ -0,0 +1,67 @@
+"""
+Easy Prompt Selector Plus の API モジュール
+拡張機能の API ルートをまとめて登録する
+"""
+
+import traceback
+
+from modules import script_callbacks
+from scripts.setup import update_manifest, get_manifest_changes
+from scripts.configs import config, debug_print
+
+MANIFEST_ROUTE = '/easy_prompt_selector_plus/manifest'
+PROFILE_ROUTE = '/easy_prompt_selector_plus/profile'
+
+# 登録するルート: (パス, 関数, メソッド) のリスト
+ROUTES = []
+
+def register_route(path, endpoint, methods):
+    """
+    アプリ起動時に追加するルートを登録
+    Args:
+        path (str): ルートのパス
+        endpoint (Callable): ルートの関数
+        methods (list): HTTP メソッド
+    """
+    ROUTES.append((path, endpoint, methods))
+
+def manifest(since: int = 0, manifest_id: str = ''):
+    """
+    指定したバージョン以降に変更されたタグファイルを返す
+    Args:
+        since (int): ブラウザが保持しているマニフェストのバージョン
+        manifest_id (str): ブラウザが保持しているマニフェストの ID
+    Returns:
+        dict: マニフェストの差分
+    """
+    changes = get_manifest_changes(update_manifest(), since, manifest_id)
+    debug_print(f"マニフェストの差分を返します: version {since} -> {changes['version']} ({len(changes['changed'])}件更新, {len(changes['removed'])}件削除)")
+    return changes
+
+def on_app_started(demo, app):
+    """
+    アプリ起動時のコールバック関数
+    登録されたルートを追加
+    Args:
+        demo: Gradio の Blocks
+        app: FastAPI アプリケーション
+    """
+    for path, endpoint, methods in ROUTES:
+        try:
+            # webui とスクリプトからの import でこのモジュールが二重に読み込まれても一度だけ追加する
+            if any(getattr(route, 'path', None) == path for route in app.routes):
+                continue
+            app.add_api_route(path, endpoint, methods=methods)
+            debug_print(f"APIルートを追加しました: {path}")
+        except Exception as e:
+            print(f"APIルートの追加中にエラーが発生しました ({path}): {str(e)}")
+            print(traceback.format_exc())
+
+register_route(MANIFEST_ROUTE, manifest, ["GET"])
+
+try:
+    # アプリ起動時のコールバックを登録
+    script_callbacks.on_app_started(on_app_started)
+except Exception as e:
+    print(f"アプリ起動コールバックの登録中にエラーが発生しました: {str(e)}")
+    print(traceback.format_exc())
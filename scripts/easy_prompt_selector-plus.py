@@ -4,23 +4,31 @@ Easy Prompt Selector Plus のメインスクリプト
 """
 
 import random
-import re
 import yaml
 import gradio as gr
 import traceback
 
+from fastapi import Body
+
 import modules.scripts as scripts
 from modules.scripts import AlwaysVisible
 from modules import shared
 from scripts.setup import write_filename_list
 from scripts.setup import get_tag_files
 from scripts.configs import config, debug_print
+from scripts.tag_snapshot import TagLoader, TagSnapshot, get_tags_hash, normalize_tags, open_snapshot, save_snapshot
+from scripts.profiler import DEFAULT_RUNS, MAX_RUNS, TEMPLATE_PATTERN, profile_templates
+from scripts.api import PROFILE_ROUTE, register_route
 
-def load_tags():
+# Script が読み込んだタグデータ（プロファイリングで使う）
+loaded_tags = None
+
+def parse_tag_files():
     """
-    タグファイルを読み込む
+    タグファイルを解析する
+    スカラー値は書かれた文字列のまま読み込み、キーと値はスナップショットと同じく文字列にそろえる
     Returns:
-        dict: 読み込まれたタグデータ
+        dict: 解析されたタグデータ
     """
     tags = {}
     try:
@@ -28,11 +36,11 @@ def load_tags():
         for filepath in get_tag_files():
             try:
                 with open(filepath, "r", encoding="utf-8") as file:
-                    yml = yaml.safe_load(file)
+                    yml = yaml.load(file, Loader=TagLoader)
                     if yml is None:
                         print(f"警告: {filepath} は空のファイルです")
                         continue
-                    tags[filepath.stem] = yml
+                    tags[filepath.stem] = normalize_tags(yml)
                     debug_print(f"タグファイルを読み込みました: {filepath}")
             except yaml.YAMLError as e:
                 print(f"YAML解析エラー ({filepath}): {str(e)}")
@@ -46,17 +54,58 @@ def load_tags():
         print(traceback.format_exc())
     return tags
 
-def find_tag(tags, location):
+def set_loaded_tags(tags):
+    """
+    Script が読み込んだタグデータを記録
+    Args:
+        tags (dict or TagSnapshot): タグデータ
+    """
+    global loaded_tags
+    loaded_tags = tags
+
+def load_tags():
+    """
+    タグファイルを読み込む
+    スナップショットが有効な場合は、タグディレクトリのハッシュに対応する
+    スナップショットを開き、なければ解析結果から作成する
+    Returns:
+        dict or TagSnapshot: 読み込まれたタグデータ
+    """
+    if not getattr(shared.opts, 'eps_enable_tag_snapshot', True):
+        return parse_tag_files()
+
+    try:
+        tags_hash = get_tags_hash()
+        snapshot = open_snapshot(tags_hash)
+        if snapshot is not None:
+            return snapshot
+
+        tags = parse_tag_files()
+        snapshot = save_snapshot(tags, tags_hash)
+        return snapshot if snapshot is not None else tags
+    except Exception as e:
+        print(f"タグスナップショットの読み込み中にエラーが発生しました: {str(e)}")
+        print(traceback.format_exc())
+        return parse_tag_files()
+
+def find_tag(tags, location, rng = None):
     """
     タグを検索する
     Args:
-        tags (dict): タグデータ
+        tags (dict or TagSnapshot): タグデータ
         location (str or list): タグの位置
+        rng (random.Random, optional): 乱数生成器（省略時は random モジュール）
     Returns:
         str: 見つかったタグ
     """
+    rng = random if rng is None else rng
     try:
         debug_print(f"タグの検索を開始します: {location}")
+        if isinstance(tags, TagSnapshot):
+            value = tags.find_tag(location, rng)
+            debug_print(f"タグを検索しました: {value}")
+            return value
+
         if type(location) == str:
             return tags[location]
 
@@ -67,15 +116,15 @@ def find_tag(tags, location):
                 value = value[tag]
 
         if type(value) == dict:
-            key = random.choice(list(value.keys()))
+            key = rng.choice(list(value.keys()))
             tag = value[key]
             if type(tag) == dict:
-                value = find_tag(tag, [random.choice(list(tag.keys()))])
+                value = find_tag(tag, [rng.choice(list(tag.keys()))], rng)
             else:
-                value = find_tag(value, key)
+                value = find_tag(value, key, rng)
 
         if (type(value) == list):
-            value = random.choice(value)
+            value = rng.choice(value)
 
         debug_print(f"タグを検索しました: {value}")
         return value
@@ -84,26 +133,30 @@ def find_tag(tags, location):
         print(traceback.format_exc())
         return ""
 
-def replace_template(tags, prompt, seed = None):
+def replace_template(tags, prompt, seed = None, stats = None, rng = None):
     """
     プロンプト内のテンプレートを置換する
     Args:
-        tags (dict): タグデータ
+        tags (dict or TagSnapshot): タグデータ
         prompt (str): プロンプトテキスト
         seed (int, optional): 乱数シード
+        stats (dict, optional): 置換のパス数 (passes) を書き込む辞書
+        rng (random.Random, optional): 乱数生成器（省略時は random モジュール）
     Returns:
         str: 置換後のプロンプト
     """
     try:
         debug_print("テンプレートの置換を開始します")
-        random.seed(seed)
+        rng = random if rng is None else rng
+        rng.seed(seed)
 
-        count = 0
-        while count < 100:
+        passes = 0
+        while passes < 100:
             if not '@' in prompt:
                 break
+            passes += 1
 
-            for match in re.finditer(r'(@((?P<num>\d+(-\d+)?)\$\$)?(?P<ref>[^>]+?)@)', prompt):
+            for match in TEMPLATE_PATTERN.finditer(prompt):
                 template = match.group()
                 try:
                     try:
@@ -112,15 +165,17 @@ def replace_template(tags, prompt, seed = None):
                         max_count = max(result)
                     except Exception as e:
                         min_count, max_count = 1, 1
-                    count = random.randint(min_count, max_count)
+                    count = rng.randint(min_count, max_count)
 
-                    values = list(map(lambda x: find_tag(tags, match.group('ref').split(':')), list(range(count))))
+                    values = list(map(lambda x: find_tag(tags, match.group('ref').split(':'), rng), list(range(count))))
                     prompt = prompt.replace(template, ', '.join(values), 1)
                 except Exception as e:
                     print(f"テンプレート置換中にエラーが発生しました: {str(e)}")
                     print(traceback.format_exc())
                     prompt = prompt.replace(template, "", 1)
 
+        if stats is not None:
+            stats["passes"] = passes
         debug_print("テンプレートの置換が完了しました")
         return prompt
     except Exception as e:
@@ -128,6 +183,25 @@ def replace_template(tags, prompt, seed = None):
         print(traceback.format_exc())
         return prompt
 
+def plan_expansions(prompts, seeds):
+    """
+    展開が必要なプロンプトを、同じテンプレートと乱数シードの組ごとにまとめる
+    同じ組は一度だけ展開して結果を共有するため、Hires のプロンプトが
+    通常のプロンプトと同じ場合は同じタグが選ばれる
+    Args:
+        prompts (list): [入力プロンプト, バッチ内のプロンプトリスト, パラメータ名] のリスト
+        seeds (list): バッチ内の各画像の乱数シード
+    Returns:
+        dict: (テンプレート, シード) -> [(プロンプトリスト, インデックス)] の辞書
+    """
+    plan = {}
+    for [prompt, all_prompts, raw_prompt_param_name] in prompts:
+        if '@' not in prompt: continue
+
+        for i, seed in enumerate(seeds):
+            plan.setdefault((all_prompts[i], seed), []).append((all_prompts, i))
+    return plan
+
 class Script(scripts.Script):
     """
     Easy Prompt Selector Plus のメインスクリプトクラス
@@ -139,6 +213,7 @@ class Script(scripts.Script):
         try:
             debug_print("スクリプトの初期化を開始します")
             self.tags = load_tags()
+            set_loaded_tags(self.tags)
             debug_print("スクリプトの初期化が完了しました")
         except Exception as e:
             print(f"スクリプト初期化中にエラーが発生しました: {str(e)}")
@@ -186,6 +261,7 @@ class Script(scripts.Script):
                 try:
                     debug_print("タグの再読み込みを開始します")
                     self.tags = load_tags()
+                    set_loaded_tags(self.tags)
                     write_filename_list()
                     debug_print("タグの再読み込みが完了しました")
                 except Exception as e:
@@ -216,15 +292,18 @@ class Script(scripts.Script):
             if getattr(p, 'hr_prompt', None): prompts.append([p.hr_prompt, p.all_hr_prompts, 'Input Prompt(Hires)'])
             if getattr(p, 'hr_negative_prompt', None): prompts.append([p.hr_negative_prompt, p.all_hr_negative_prompts, 'Input NegativePrompt(Hires)'])
 
-            for i in range(len(p.all_prompts)):
-                seed = random.random()
-                for [prompt, all_prompts, raw_prompt_param_name] in prompts:
-                    if '@' not in prompt: continue
-
-                    self.save_prompt_to_pnginfo(p, prompt, raw_prompt_param_name)
+            # 元プロンプトはバッチ内で変わらないのでジョブごとに一度だけ保存する
+            for [prompt, all_prompts, raw_prompt_param_name] in prompts:
+                if '@' not in prompt: continue
+                self.save_prompt_to_pnginfo(p, prompt, raw_prompt_param_name)
 
-                    replaced = "".join(replace_template(self.tags, all_prompts[i], seed))
+            seeds = [random.random() for _ in range(len(p.all_prompts))]
+            plan = plan_expansions(prompts, seeds)
+            for (template, seed), targets in plan.items():
+                replaced = "".join(replace_template(self.tags, template, seed))
+                for all_prompts, i in targets:
                     all_prompts[i] = replaced
+            debug_print(f"テンプレートを展開しました: {len(plan)}件 (対象 {sum(map(len, plan.values()))}件)")
             debug_print("テンプレートタグの置換が完了しました")
         except Exception as e:
             print(f"テンプレートタグ置換中にエラーが発生しました: {str(e)}")
@@ -262,3 +341,24 @@ class Script(scripts.Script):
         except Exception as e:
             print(f"プロンプト処理中にエラーが発生しました: {str(e)}")
             print(traceback.format_exc())
+
+def profile_tags(templates: list = Body([]), runs: int = Body(DEFAULT_RUNS)):
+    """
+    サンプルテンプレートを展開してプロファイリング結果を返す
+    生成に使っている読み込み済みのタグデータを対象にし、まだ読み込まれていない場合だけ読み込む
+    Args:
+        templates (list): サンプルテンプレート（空の場合は全ての参照）
+        runs (int): テンプレートごとの展開回数（MAX_RUNS まで）
+    Returns:
+        dict: プロファイリング結果
+    """
+    runs = min(max(1, runs), MAX_RUNS)
+    tags = loaded_tags if loaded_tags is not None else load_tags()
+    return profile_templates(tags, [str(template) for template in templates], replace_template, runs)
+
+try:
+    # プロファイリングのルートを登録
+    register_route(PROFILE_ROUTE, profile_tags, ["POST"])
+except Exception as e:
+    print(f"APIルートの登録中にエラーが発生しました: {str(e)}")
+    print(traceback.format_exc())
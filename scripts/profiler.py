@@ -0,0 +1,287 @@
+"""
+Easy Prompt Selector Plus のプロファイリングモジュール
+タグツリーとサンプルテンプレートから展開コストと出力サイズを集計する
+"""
+
+import math
+import random
+import re
+import time
+import traceback
+
+from scripts.tag_snapshot import TagSnapshot, NODE_DICT, NODE_LIST
+from scripts.configs import config, debug_print
+
+# テンプレートの形式（replace_template もこのパターンで置換する）
+TEMPLATE_PATTERN = re.compile(r'(@((?P<num>\d+(-\d+)?)\$\$)?(?P<ref>[^>]+?)@)')
+
+DEFAULT_RUNS = 100
+MAX_RUNS = 10000
+MAX_EXPANSIONS = 100000  # 一回のプロファイリングで行う展開回数の合計の上限
+
+def children(tags, node):
+    """
+    辞書ノードの子を取得
+    Args:
+        tags (dict or TagSnapshot): タグデータ
+        node: ノード（辞書データの値またはスナップショットのノードID）
+    Returns:
+        list: (キー, 子ノード) のリスト（辞書でない場合は None）
+    """
+    if isinstance(tags, TagSnapshot):
+        if tags.kind(node) != NODE_DICT:
+            return None
+        return [(key, tags.child_at(node, i)) for i, key in enumerate(tags.keys(node))]
+    if type(node) == dict:
+        return [(str(key), child) for key, child in node.items()]
+    return None
+
+def leaves(tags, node):
+    """
+    リストノードまたは葉ノードの文字列を取得
+    Args:
+        tags (dict or TagSnapshot): タグデータ
+        node: ノード（辞書データの値またはスナップショットのノードID）
+    Returns:
+        list: 文字列のリスト
+    """
+    if isinstance(tags, TagSnapshot):
+        if tags.kind(node) == NODE_LIST:
+            return [tags.leaf(node, i) for i in range(tags.size(node))]
+        return [tags.leaf(node)]
+    if type(node) == list:
+        return ['' if value is None else str(value) for value in node]
+    return ['' if node is None else str(node)]
+
+def root(tags):
+    """
+    タグツリーのルートノードを取得
+    Args:
+        tags (dict or TagSnapshot): タグデータ
+    Returns:
+        ルートノード
+    """
+    return tags.root if isinstance(tags, TagSnapshot) else tags
+
+def template_refs(text):
+    """
+    テキスト内のテンプレート参照を取得
+    Args:
+        text (str): テキスト
+    Returns:
+        list: 参照の一覧（例: "人:髪"）
+    """
+    return [match.group('ref') for match in TEMPLATE_PATTERN.finditer(text)]
+
+def collect_references(tags):
+    """
+    タグツリー内の全ての参照について、葉の数、深さなどを集計
+    Args:
+        tags (dict or TagSnapshot): タグデータ
+    Returns:
+        dict: 参照 -> 集計結果 の辞書
+    """
+    references = {}
+
+    def visit(node, path):
+        items = children(tags, node)
+        if items is None:
+            values = leaves(tags, node)
+            stats = {
+                "leaves": len(values),
+                "depth": 0,
+                "max_leaf_chars": max(map(len, values), default=0),
+                "nested_refs": sorted({ref for value in values for ref in template_refs(value)}),
+            }
+        else:
+            stats = {"leaves": 0, "depth": 0, "max_leaf_chars": 0, "nested_refs": set()}
+            for key, child in items:
+                child_stats = visit(child, path + [key])
+                stats["leaves"] += child_stats["leaves"]
+                stats["depth"] = max(stats["depth"], child_stats["depth"] + 1)
+                stats["max_leaf_chars"] = max(stats["max_leaf_chars"], child_stats["max_leaf_chars"])
+                stats["nested_refs"].update(child_stats["nested_refs"])
+            stats["nested_refs"] = sorted(stats["nested_refs"])
+
+        if path:
+            references[':'.join(path)] = stats
+        return stats
+
+    visit(root(tags), [])
+    return references
+
+def expansion_depths(references):
+    """
+    各参照が葉の中のテンプレートを通して何段まで入れ子になるかを計算
+    一度計算した参照の結果は再利用する
+    Args:
+        references (dict): collect_references の結果
+    Returns:
+        dict: 参照 -> (入れ子の段数, 循環参照に到達するかどうか) の辞書
+    """
+    results = {}
+    visiting = set()
+
+    def visit(ref):
+        if ref in results:
+            return results[ref]
+        if ref in visiting:
+            return 0, True
+        stats = references.get(ref)
+        if stats is None:
+            return 0, False
+
+        visiting.add(ref)
+        depth, cyclic = 0, False
+        for nested in stats["nested_refs"]:
+            nested_depth, nested_cyclic = visit(nested)
+            depth = max(depth, nested_depth + 1)
+            cyclic = cyclic or nested_cyclic
+        visiting.discard(ref)
+        results[ref] = (depth, cyclic)
+        return results[ref]
+
+    for ref in references:
+        visit(ref)
+    return results
+
+def reachable_leaves(references, refs):
+    """
+    参照から葉の中のテンプレートもたどって到達できる葉の数を計算
+    Args:
+        references (dict): collect_references の結果
+        refs (list): 参照の一覧
+    Returns:
+        int: 到達できる葉の数
+    """
+    seen = set()
+    stack = [ref for ref in refs if ref in references]
+    while stack:
+        ref = stack.pop()
+        if ref in seen:
+            continue
+        seen.add(ref)
+        stack.extend(nested for nested in references[ref]["nested_refs"] if nested in references)
+
+    def covered(ref):
+        # 親の参照もたどれる場合は、親の葉の数に含まれている
+        parts = ref.split(':')
+        return any(':'.join(parts[:i]) in seen for i in range(1, len(parts)))
+
+    return sum(references[ref]["leaves"] for ref in seen if not covered(ref))
+
+def percentile(values, q):
+    """
+    最近傍順位法でパーセンタイルを計算
+    Args:
+        values (list): 昇順に並んだ値
+        q (float): パーセンタイル（0〜100）
+    Returns:
+        float: パーセンタイル値
+    """
+    if not values:
+        return 0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+def distribution(values):
+    """
+    値の分布を集計
+    Args:
+        values (list): 値のリスト
+    Returns:
+        dict: 最小、平均、パーセンタイル、最大
+    """
+    values = sorted(values)
+    return {
+        "min": values[0] if values else 0,
+        "mean": sum(values) / len(values) if values else 0,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0,
+    }
+
+def profile_templates(tags, templates, expand, runs=DEFAULT_RUNS):
+    """
+    タグツリーとサンプルテンプレートのプロファイリングを行う
+    テンプレートを指定しない場合は、タグツリーの全ての参照を一つずつ展開する
+    循環参照に到達するテンプレートは展開が終わらないため計測しない
+    テンプレート数 × 展開回数が MAX_EXPANSIONS を超える場合は展開回数（足りなければテンプレート数）を減らし、
+    結果の truncated で知らせる
+    生成中の処理と乱数を共有しないように、専用の乱数生成器で展開する
+    Args:
+        tags (dict or TagSnapshot): タグデータ
+        templates (list): サンプルテンプレート
+        expand (Callable): (tags, prompt, seed, stats, rng) を受け取る replace_template
+        runs (int): テンプレートごとの展開回数
+    Returns:
+        dict: JSON に変換できるプロファイリング結果
+    """
+    try:
+        debug_print(f"プロファイリングを開始します: {len(templates)}テンプレート, {runs}回")
+        references = collect_references(tags)
+        depths = expansion_depths(references)
+        reference_report = []
+        for ref, stats in references.items():
+            depth, cyclic = depths[ref]
+            reference_report.append(dict(stats, ref=ref, expansion_depth=depth, cyclic=cyclic))
+        reference_report.sort(key=lambda stats: stats["leaves"], reverse=True)
+
+        if not templates:
+            templates = [f"@{ref}@" for ref in references]
+
+        requested_templates, requested_runs = len(templates), runs
+        templates = templates[:MAX_EXPANSIONS]
+        runs = max(1, min(runs, MAX_EXPANSIONS // max(1, len(templates))))
+        truncated = len(templates) < requested_templates or runs < requested_runs
+        if truncated:
+            debug_print(f"展開回数の上限のため縮小します: {requested_templates}テンプレート x {requested_runs}回 -> {len(templates)}テンプレート x {runs}回")
+
+        rng = random.Random()
+        template_report = []
+        for template in templates:
+            refs = template_refs(template)
+            report = {
+                "template": template,
+                "references": refs,
+                "reachable_leaves": reachable_leaves(references, refs),
+                "unknown_references": [ref for ref in refs if ref not in references],
+                "cyclic": any(depths[ref][1] for ref in refs if ref in depths),
+            }
+            if report["cyclic"]:
+                debug_print(f"循環参照のため展開をスキップします: {template}")
+                template_report.append(report)
+                continue
+
+            latencies, chars, tag_counts, passes = [], [], [], []
+            for seed in range(runs):
+                stats = {}
+                start = time.perf_counter()
+                output = expand(tags, template, seed, stats, rng)
+                latencies.append((time.perf_counter() - start) * 1000)
+                chars.append(len(output))
+                tag_counts.append(len([tag for tag in output.split(',') if tag.strip()]))
+                passes.append(stats.get("passes", 0))
+
+            report.update({
+                "latency_ms": distribution(latencies),
+                "output_chars": distribution(chars),
+                "output_tags": distribution(tag_counts),
+                "passes": distribution(passes),
+            })
+            template_report.append(report)
+        template_report.sort(key=lambda stats: stats["latency_ms"]["p99"] if "latency_ms" in stats else math.inf, reverse=True)
+
+        debug_print("プロファイリングが完了しました")
+        return {
+            "runs": runs,
+            "requested_runs": requested_runs,
+            "requested_templates": requested_templates,
+            "truncated": truncated,
+            "references": reference_report,
+            "templates": template_report,
+        }
+    except Exception as e:
+        print(f"プロファイリング中にエラーが発生しました: {str(e)}")
+        print(traceback.format_exc())
+        return {"runs": runs, "error": str(e)}
@@ -33,6 +33,16 @@ def on_ui_settings():
                 section=section,
             ),
         )
+
+        # タグスナップショットを使用する設定
+        shared.opts.add_option(
+            key="eps_enable_tag_snapshot",
+            info=shared.OptionInfo(
+                True,
+                label="タグをバイナリスナップショットにして複数プロセスで共有する (mmap)",
+                section=section,
+            ),
+        )
     except Exception as e:
         print(f"UI設定の追加中にエラーが発生しました: {str(e)}")
         print(traceback.format_exc())
@@ -4,9 +4,14 @@ Easy Prompt Selector Plus のセットアップモジュール
 """
 
 from pathlib import Path
+import hashlib
+import json
 import shutil
 import os
+import tempfile
+import threading
 import traceback
+import uuid
 
 from modules import scripts
 from modules import shared
@@ -22,6 +27,10 @@ EXAMPLES_DIR = BASE_DIR.joinpath('tags_examples')  # サンプルタグディレ
 
 # ファイル名の定義
 FILENAME_LIST = 'easyPromptSelectorPlus.txt'
+MANIFEST_FILE = 'easyPromptSelectorPlus.json'
+
+# 🔄 では reload() とブラウザからのマニフェスト要求が別スレッドで同時に走るため排他する
+MANIFEST_LOCK = threading.Lock()
 
 def create_directories():
     """
@@ -101,9 +110,129 @@ def get_tag_files():
         print(traceback.format_exc())
         return []
 
+def write_atomic(path, data):
+    """
+    一時ファイル経由でファイルを置き換える
+    他のスレッドやプロセスと一時ファイルが衝突しないように mkstemp で作成する
+    Args:
+        path (Path): 書き出し先のパス
+        data (bytes): 書き出す内容
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def empty_manifest():
+    """
+    空のマニフェストを作成
+    マニフェストを作り直した場合にブラウザ側のバージョンと区別できるように ID を振る
+    Returns:
+        dict: 空のマニフェスト
+    """
+    return {"id": uuid.uuid4().hex, "version": 0, "files": {}, "removed": {}}
+
+def load_manifest():
+    """
+    前回書き出したマニフェストを読み込む
+    Returns:
+        dict: マニフェスト
+    """
+    try:
+        with open(TEMP_DIR.joinpath(MANIFEST_FILE), 'r', encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not all(key in manifest for key in empty_manifest()):
+            raise ValueError("マニフェストの形式が不正です")
+        return manifest
+    except FileNotFoundError:
+        return empty_manifest()
+    except Exception as e:
+        print(f"マニフェストの読み込み中にエラーが発生しました: {str(e)}")
+        print(traceback.format_exc())
+        return empty_manifest()
+
+def update_manifest():
+    """
+    タグファイルのマニフェストを差分更新して書き出し
+    サイズと更新日時が前回と同じファイルはハッシュを再計算しない
+    Returns:
+        dict: 更新後のマニフェスト
+    """
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        try:
+            debug_print("マニフェストの更新を開始します")
+            previous = manifest["files"]
+            removed = manifest["removed"]
+            version = manifest["version"] + 1
+            changed = False
+
+            files = {}
+            for path in get_tag_files():
+                key = str(path)
+                stat = path.stat()
+                entry = previous.get(key)
+                if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                    files[key] = entry
+                    continue
+
+                digest = hashlib.sha256(path.read_bytes()).hexdigest()
+                if entry and entry["hash"] == digest:
+                    files[key] = dict(entry, mtime=stat.st_mtime_ns)
+                    continue
+
+                files[key] = {"hash": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns, "version": version}
+                removed.pop(key, None)
+                changed = True
+                debug_print(f"マニフェストを更新しました: {key}")
+
+            for key in previous.keys() - files.keys():
+                removed[key] = version
+                changed = True
+                debug_print(f"マニフェストから削除しました: {key}")
+
+            if changed:
+                manifest["version"] = version
+            manifest["files"] = files
+
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            write_atomic(TEMP_DIR.joinpath(MANIFEST_FILE), data)
+            debug_print(f"マニフェストを書き出しました: version {manifest['version']}")
+        except Exception as e:
+            print(f"マニフェスト更新中にエラーが発生しました: {str(e)}")
+            print(traceback.format_exc())
+        return manifest
+
+def get_manifest_changes(manifest, since, manifest_id=''):
+    """
+    指定したバージョン以降に変更されたマニフェストのエントリを取得
+    マニフェストの ID が異なる場合やバージョンが不明な場合は全件を返す
+    Args:
+        manifest (dict): マニフェスト
+        since (int): ブラウザが保持しているマニフェストのバージョン
+        manifest_id (str): ブラウザが保持しているマニフェストの ID
+    Returns:
+        dict: マニフェストの ID、現在のバージョン、全件かどうか、変更されたファイル、削除されたファイル
+    """
+    full = manifest_id != manifest["id"] or since <= 0 or since > manifest["version"]
+    changed = [
+        {"path": path, "hash": entry["hash"], "size": entry["size"]}
+        for path, entry in sorted(manifest["files"].items())
+        if full or entry["version"] > since
+    ]
+    removed = [] if full else sorted(path for path, version in manifest["removed"].items() if version > since)
+    return {"id": manifest["id"], "version": manifest["version"], "full": full, "changed": changed, "removed": removed}
+
 def write_filename_list():
     """
-    タグファイルのリストを一時ファイルに書き出し
+    タグファイルのリストとマニフェストを一時ファイルに書き出し
     """
     try:
         debug_print("ファイルリストの書き出しを開始します")
@@ -119,6 +248,8 @@ def write_filename_list():
         with open(TEMP_DIR.joinpath(FILENAME_LIST), 'w', encoding="utf-8") as f:
             f.write('\n'.join(sorted(filepaths)))
         debug_print(f"ファイルリストを書き出しました: {TEMP_DIR.joinpath(FILENAME_LIST)}")
+
+        update_manifest()
     except Exception as e:
         print(f"ファイルリスト書き出し中にエラーが発生しました: {str(e)}")
         print(traceback.format_exc())
@@ -0,0 +1,404 @@
+"""
+Easy Prompt Selector Plus のタグスナップショットモジュール
+読み込んだタグツリーを読み取り専用のバイナリ形式にコンパイルし、
+mmap で複数のプロセスから共有する
+"""
+
+from array import array
+from pathlib import Path
+import hashlib
+import mmap
+import os
+import random
+import traceback
+import yaml
+
+from scripts.setup import TEMP_DIR, get_tags_dir, get_tag_files, write_atomic
+from scripts.configs import config, debug_print
+
+# ファイル形式の定義
+SNAPSHOT_MAGIC = b'EPSS'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_PREFIX = 'easyPromptSelectorPlus-'
+SNAPSHOT_SUFFIX = '.bin'
+
+# ノードの種類
+NODE_DICT = 0
+NODE_LIST = 1
+NODE_LEAF = 2
+
+# ヘッダー: magic(4バイト) + version, string_count, blob_size, node_count, edge_count, leaf_count, root
+HEADER_FIELDS = 7
+HEADER_SIZE = len(SNAPSHOT_MAGIC) + HEADER_FIELDS * 4
+
+def get_tags_hash():
+    """
+    タグディレクトリの内容からハッシュを計算
+    Returns:
+        str: タグディレクトリのハッシュ値
+    """
+    tags_dir = get_tags_dir()
+    digest = hashlib.sha256()
+    digest.update(SNAPSHOT_MAGIC + SNAPSHOT_VERSION.to_bytes(4, 'little'))
+    for filepath in sorted(get_tag_files()):
+        digest.update(str(filepath.relative_to(tags_dir)).encode('utf-8') + b'\0')
+        digest.update(filepath.read_bytes() + b'\0')
+    return digest.hexdigest()
+
+def get_snapshot_path(tags_hash):
+    """
+    スナップショットファイルのパスを取得
+    Args:
+        tags_hash (str): タグディレクトリのハッシュ値
+    Returns:
+        Path: スナップショットファイルのパス
+    """
+    return TEMP_DIR.joinpath(f"{SNAPSHOT_PREFIX}{tags_hash[:16]}{SNAPSHOT_SUFFIX}")
+
+class TagLoader(yaml.SafeLoader):
+    """
+    タグファイル用の YAML ローダー
+    yes / on / 1.0 などのスカラー値を bool や数値に変換せず、書かれた文字列のまま読み込む
+    （ブラウザ側のボタンに表示される文字列と展開結果をそろえるため。null だけは空文字として扱う）
+    """
+
+TagLoader.yaml_implicit_resolvers = {
+    first: [(tag, regexp) for tag, regexp in resolvers if tag not in (
+        'tag:yaml.org,2002:bool', 'tag:yaml.org,2002:int',
+        'tag:yaml.org,2002:float', 'tag:yaml.org,2002:timestamp',
+    )]
+    for first, resolvers in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+
+def normalize_tags(value):
+    """
+    タグデータのキーと値を文字列にそろえる
+    辞書データとスナップショットで同じ展開結果になるように、両方で使う
+    Args:
+        value: YAML から読み込んだ値
+    Returns:
+        dict, list or str: キーと葉が文字列になったタグデータ
+    """
+    if type(value) == dict:
+        return {normalize_tags(key): normalize_tags(child) for key, child in value.items()}
+    if type(value) == list:
+        items = []
+        for item in value:
+            if type(item) in (dict, list):
+                print(f"警告: リスト内の辞書やリストはタグとして使えないため無視します: {item}")
+                continue
+            items.append(normalize_tags(item))
+        return items
+    return '' if value is None else str(value)
+
+def compile_tags(tags):
+    """
+    タグデータをスナップショット形式のバイト列にコンパイル
+    Args:
+        tags (dict): normalize_tags でそろえたタグデータ
+    Returns:
+        bytes: コンパイルされたスナップショット
+    """
+    strings = {}
+    string_offsets = array('I', [0])
+    blob = bytearray()
+    nodes = array('I')
+    edges = array('I')
+    order = array('I')
+    leaves = array('I')
+
+    def intern(text):
+        sid = strings.get(text)
+        if sid is None:
+            sid = strings[text] = len(strings)
+            blob.extend(text.encode('utf-8'))
+            string_offsets.append(len(blob))
+        return sid
+
+    def add_node(value):
+        nid = len(nodes) // 3
+        if type(value) == dict:
+            nodes.extend((NODE_DICT, 0, len(value)))
+            # 子ノードより先に辺の領域を確保して連続した配置にする
+            start = len(edges) // 2
+            edges.extend([0] * (len(value) * 2))
+            # キーのバイト列順に並べた辺の位置（二分探索用）
+            keys = list(value.keys())
+            order.extend(sorted(range(len(keys)), key=lambda i: keys[i].encode('utf-8')))
+            nodes[nid * 3 + 1] = start
+            for i, (key, child) in enumerate(value.items()):
+                edges[(start + i) * 2] = intern(key)
+                edges[(start + i) * 2 + 1] = add_node(child)
+        elif type(value) == list:
+            nodes.extend((NODE_LIST, len(leaves), len(value)))
+            leaves.extend(intern(item) for item in value)
+        else:
+            nodes.extend((NODE_LEAF, intern(value), 0))
+        return nid
+
+    root = add_node(tags)
+    blob.extend(b'\0' * (-len(blob) % 4))
+
+    header = array('I', [
+        SNAPSHOT_VERSION, len(strings), len(blob),
+        len(nodes) // 3, len(edges) // 2, len(leaves), root,
+    ])
+    return b''.join([
+        SNAPSHOT_MAGIC, header.tobytes(), string_offsets.tobytes(),
+        bytes(blob), nodes.tobytes(), edges.tobytes(), order.tobytes(), leaves.tobytes(),
+    ])
+
+def write_snapshot(tags, path):
+    """
+    スナップショットをファイルに書き出し
+    別プロセスが途中のファイルを読まないように一時ファイル経由で置き換える
+    Args:
+        tags (dict): タグデータ
+        path (Path): 書き出し先のパス
+    """
+    data = compile_tags(tags)
+    write_atomic(path, data)
+    debug_print(f"タグスナップショットを書き出しました: {path} ({len(data)}バイト)")
+
+def remove_stale_snapshots(path):
+    """
+    使用中以外の古いスナップショットを削除
+    Args:
+        path (Path): 使用中のスナップショットのパス
+    """
+    for stale in TEMP_DIR.glob(f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}"):
+        if stale == path:
+            continue
+        try:
+            stale.unlink()
+            debug_print(f"古いタグスナップショットを削除しました: {stale}")
+        except OSError:
+            # 他のプロセスが開いている場合は次回に任せる
+            pass
+
+class TagSnapshot:
+    """
+    mmap されたタグスナップショットの読み取り専用ビュー
+    """
+    def __init__(self, path):
+        """
+        スナップショットファイルを開く
+        Args:
+            path (Path): スナップショットファイルのパス
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._mmap)
+        if bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+            raise ValueError(f"タグスナップショットの形式が不正です: {self.path}")
+        header = view[len(SNAPSHOT_MAGIC):HEADER_SIZE].cast('I')
+        version, string_count, blob_size, node_count, edge_count, leaf_count, self.root = header
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"タグスナップショットのバージョンが異なります: {version}")
+
+        offset = HEADER_SIZE
+        def section(size, fmt='I'):
+            nonlocal offset
+            itemsize = 4 if fmt == 'I' else 1
+            part = view[offset:offset + size * itemsize]
+            offset += size * itemsize
+            return part.cast(fmt) if fmt == 'I' else part
+
+        self._string_offsets = section(string_count + 1)
+        self._blob = section(blob_size, 'B')
+        self._nodes = section(node_count * 3)
+        self._edges = section(edge_count * 2)
+        self._order = section(edge_count)
+        self._leaves = section(leaf_count)
+        # 解決済みの位置 -> ノードID のキャッシュ
+        self._locations = {}
+
+    def string(self, sid):
+        """
+        文字列テーブルから文字列を取得
+        Args:
+            sid (int): 文字列ID
+        Returns:
+            str: 文字列
+        """
+        return str(self._blob[self._string_offsets[sid]:self._string_offsets[sid + 1]], 'utf-8')
+
+    def kind(self, nid):
+        """
+        ノードの種類を取得
+        Args:
+            nid (int): ノードID
+        Returns:
+            int: NODE_DICT / NODE_LIST / NODE_LEAF
+        """
+        return self._nodes[nid * 3]
+
+    def size(self, nid):
+        """
+        ノードの子要素数を取得
+        Args:
+            nid (int): ノードID
+        Returns:
+            int: 辞書のキー数またはリストの要素数
+        """
+        return self._nodes[nid * 3 + 2]
+
+    def keys(self, nid):
+        """
+        辞書ノードのキーを取得
+        Args:
+            nid (int): ノードID
+        Returns:
+            list: キーの一覧
+        """
+        start = self._nodes[nid * 3 + 1]
+        return [self.string(self._edges[(start + i) * 2]) for i in range(self.size(nid))]
+
+    def child_at(self, nid, index):
+        """
+        辞書ノードの index 番目の子ノードを取得
+        Args:
+            nid (int): ノードID
+            index (int): 子の位置
+        Returns:
+            int: 子ノードID
+        """
+        return self._edges[(self._nodes[nid * 3 + 1] + index) * 2 + 1]
+
+    def child(self, nid, key):
+        """
+        辞書ノードからキーで子ノードを取得
+        Args:
+            nid (int): ノードID
+            key (str): キー
+        Returns:
+            int: 子ノードID
+        """
+        if self.kind(nid) != NODE_DICT:
+            raise KeyError(key)
+        encoded = str(key).encode('utf-8')
+        offsets, edges, order = self._string_offsets, self._edges, self._order
+        start = self._nodes[nid * 3 + 1]
+        low, high = 0, self.size(nid)
+        while low < high:
+            middle = (low + high) // 2
+            edge = (start + order[start + middle]) * 2
+            sid = edges[edge]
+            current = self._blob[offsets[sid]:offsets[sid + 1]].tobytes()
+            if current < encoded:
+                low = middle + 1
+            elif current > encoded:
+                high = middle
+            else:
+                return edges[edge + 1]
+        raise KeyError(key)
+
+    def leaf(self, nid, index=0):
+        """
+        リストノードまたは葉ノードの文字列を取得
+        Args:
+            nid (int): ノードID
+            index (int): リスト内の位置
+        Returns:
+            str: 文字列
+        """
+        if self.kind(nid) == NODE_LIST:
+            return self.string(self._leaves[self._nodes[nid * 3 + 1] + index])
+        return self.string(self._nodes[nid * 3 + 1])
+
+    def locate(self, location):
+        """
+        位置からノードを取得
+        Args:
+            location (list): タグの位置
+        Returns:
+            int: ノードID
+        """
+        path = tuple(location)
+        nid = self._locations.get(path)
+        if nid is None:
+            nid = self.root
+            for key in path:
+                nid = self.child(nid, key)
+            self._locations[path] = nid
+        return nid
+
+    def resolve(self, nid, rng=random):
+        """
+        ノードからランダムにタグを選ぶ
+        乱数の消費順は辞書データに対する find_tag と同じにする
+        Args:
+            nid (int): ノードID
+            rng (random.Random, optional): 乱数生成器（省略時は random モジュール）
+        Returns:
+            str: 選ばれたタグ
+        """
+        if self.kind(nid) == NODE_DICT:
+            tag = self.child_at(nid, rng.choice(range(self.size(nid))))
+            if self.kind(tag) == NODE_DICT:
+                return self.resolve(self.child_at(tag, rng.choice(range(self.size(tag)))), rng)
+            nid = tag
+
+        if self.kind(nid) == NODE_LIST:
+            return self.leaf(nid, rng.choice(range(self.size(nid))))
+        return self.leaf(nid)
+
+    def find_tag(self, location, rng=random):
+        """
+        タグを検索する
+        Args:
+            location (str or list): タグの位置
+            rng (random.Random, optional): 乱数生成器（省略時は random モジュール）
+        Returns:
+            str: 見つかったタグ
+        """
+        if type(location) == str:
+            location = [location]
+        if len(location) == 0:
+            return ''
+        return self.resolve(self.locate(location), rng)
+
+    def __len__(self):
+        return self.size(self.root)
+
+def open_snapshot(tags_hash):
+    """
+    既存のスナップショットを開く
+    Args:
+        tags_hash (str): タグディレクトリのハッシュ値
+    Returns:
+        TagSnapshot: スナップショット（存在しない場合は None）
+    """
+    path = get_snapshot_path(tags_hash)
+    if not path.exists():
+        return None
+    try:
+        snapshot = TagSnapshot(path)
+        debug_print(f"タグスナップショットを開きました: {path}")
+        return snapshot
+    except Exception as e:
+        print(f"タグスナップショットを開けませんでした ({path}): {str(e)}")
+        print(traceback.format_exc())
+        return None
+
+def save_snapshot(tags, tags_hash):
+    """
+    スナップショットを書き出して開く
+    Args:
+        tags (dict): タグデータ
+        tags_hash (str): タグディレクトリのハッシュ値
+    Returns:
+        TagSnapshot: スナップショット（失敗した場合は None）
+    """
+    path = get_snapshot_path(tags_hash)
+    try:
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        write_snapshot(tags, path)
+        remove_stale_snapshots(path)
+        return TagSnapshot(path)
+    except Exception as e:
+        print(f"タグスナップショットの書き出し中にエラーが発生しました ({path}): {str(e)}")
+        print(traceback.format_exc())
+        return None